@@ -1,13 +1,13 @@
-import json
 import os
 import logging
 import argparse
 from datetime import datetime, timedelta
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from src.models.cerebras_inference import CerebrasInference
 from src.knowledge_graph_updater import KnowledgeGraphUpdater
-from src.pubmed_scraper import fetch_and_save_articles
+from src.pubmed_scraper import fetch_and_save_articles, load_articles
 
 logger = logging.getLogger(__name__)
 
@@ -26,13 +26,70 @@ def setup_logging(log_dir='logs'):
 log_file = setup_logging()
 logger = logging.getLogger(__name__)
 
+# How many extraction worker threads to run (bounded by provider rate limits)
+CONCURRENT_BATCHES = 16
+# How many abstracts to pack into a single LLM request
+ABSTRACT_BATCH_SIZE = 8
+# Checkpoint the graph to disk every N completed abstracts for fault tolerance
+CHECKPOINT_INTERVAL = 25
+
+def make_batches(data, batch_size):
+    """Split the abstract list into mini-batches for batched LLM calls.
+
+    Abstracts are sorted by length first so each batch holds similar-sized
+    inputs: a batched request costs its longest entry, so mixing a short
+    abstract into a long batch wastes the difference in padding.
+    """
+    ordered = sorted(data, key=lambda a: len(a.get('abstract', '')))
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+def process_all(updater, data):
+    """Extract all abstracts concurrently, applying graph updates as they complete.
+
+    Abstracts are packed into mini-batches so one LLM request covers several of
+    them, and every hot call in extraction (LLM + PubTator) is network I/O, so
+    worker threads release the GIL while they wait. Graph mutations all happen
+    on this thread as futures complete, so the graph stays single-threaded.
+    """
+    batches = make_batches(data, ABSTRACT_BATCH_SIZE)
+
+    completed = 0
+    with ThreadPoolExecutor(max_workers=CONCURRENT_BATCHES) as executor, \
+         tqdm(total=len(data), desc="Processing Abstracts", unit="abstract") as pbar:
+        futures = {executor.submit(updater.extract_abstracts_batch, batch): batch
+                   for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                extractions = future.result()
+            except Exception as e:
+                logger.error(f"Error extracting abstract batch: {e}")
+                pbar.update(len(batch))
+                continue
+            for abstract_info, (entities, relations) in zip(batch, extractions):
+                try:
+                    tqdm.write(f"Processing abstract with PMID: {abstract_info.get('pmid', 'N/A')} - {abstract_info['title']}")
+
+                    updates = updater.apply_extraction(abstract_info, entities, relations)
+                    logger.info(f"Successfully processed abstract {abstract_info.get('pmid', 'N/A')} with {len(updates)} updates.")
+                except Exception as e:
+                    logger.error(f"Error processing abstract {abstract_info.get('pmid', 'N/A')}: {e}")
+                completed += 1
+                pbar.update(1)
+                if completed % CHECKPOINT_INTERVAL == 0:
+                    updater.save_graph()
+                    logger.info(f"Checkpointed knowledge graph after {completed} abstracts")
+
+    updater.save_graph()
+    logger.info("Successfully saved updated knowledge graph")
+
 if __name__ == "__main__":
     # parse CL args
     parser = argparse.ArgumentParser()
     parser.add_argument("--graph_path", default="./data/knowledge_graph.json",
                         help="Path to the knowledge graph JSON file.")
-    parser.add_argument("--data_path", default="./data/data.json",
-                        help="Path to the input abstracts JSON file.")
+    parser.add_argument("--data_path", default="./data/data.ndjson",
+                        help="Path to the input abstracts NDJSON file.")
     # Can switch back to llama3.1-8b for lighter compute
     parser.add_argument("--model_name", default="llama3.3-70b",
                         help="Name of the model to use")
@@ -46,7 +103,7 @@ if __name__ == "__main__":
     print(f"Model name: {args.model_name}")
     logger.info(f"Logging to file: {log_file}")
 
-    # If data.json doesn't exist / is empty, fetch new articles
+    # If the data file doesn't exist / is empty, fetch new articles
     if not os.path.exists(args.data_path) or os.path.getsize(args.data_path) == 0:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=args.years_back*365)
@@ -74,24 +131,14 @@ if __name__ == "__main__":
     )
 
     # Load abstracts
-    with open(args.data_path, "r") as f:
-        data = json.load(f)
+    data = load_articles(args.data_path)
     print(f"Loaded {len(data)} abstracts for processing.")
 
-    # Use tqdm for progress tracking
-    for abstract_info in tqdm(data, desc="Processing Abstracts", unit="abstract"):
-        try:
-            print(f"\nProcessing abstract with PMID: {abstract_info.get('pmid', 'N/A')}")
-            print(f"Title: {abstract_info['title']}")
-            print(f"Abstract: {abstract_info['abstract'][:100]}...")
-
-            # process abstract + update graph
-            updates = updater.process_abstract(abstract_info)
-            logger.info(f"Successfully processed abstract {abstract_info.get('pmid', 'N/A')} with {len(updates)} updates.")
-            updater.save_graph()  # save updated graph
-            logger.info("Successfully saved updated knowledge graph")
-        except Exception as e:
-            logger.error(f"Error processing abstract {abstract_info.get('pmid', 'N/A')}: {e}")
+    # Process abstracts concurrently (extraction is I/O-bound on remote APIs)
+    try:
+        process_all(updater, data)
+    finally:
+        updater.pubtator_api.close()
 
     logger.info("Finished processing all abstracts.")
     print("Program completed.")
\ No newline at end of file
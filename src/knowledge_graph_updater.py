@@ -1,32 +1,57 @@
+import atexit
 import os
-import json
 import logging
+import orjson
+from dataclasses import asdict
 from datetime import datetime
 from typing import Dict, List, Optional
-from difflib import SequenceMatcher
-import numpy as np
+from rapidfuzz import fuzz, process
 
 from src.pubtator import PubTatorAPI
 from src.models.cerebras_inference import CerebrasInference, EntityInfo, RelationInfo
 
 logger = logging.getLogger(__name__)
 
+def _trigrams(text: str) -> set:
+    """Return the set of 3-gram shingles of a string (the string itself if shorter)."""
+    if len(text) < 3:
+        return {text}
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
 class KnowledgeGraphUpdater:
+    # Graph files above this size are stream-parsed instead of decoded in one
+    # shot, avoiding holding the raw bytes and the full dict at the same time
+    STREAM_PARSE_THRESHOLD = 1 << 30  # 1 GiB
+
     def __init__(self, graph_path: str, entity_aliases_path: str, model: CerebrasInference):
         # Initialize empty data structs
         self.graph = {"nodes": {}, "edges": {}}
+        self._edges = {}
         self.entity_aliases = {}
         
         # Store paths for later saving
         self.graph_path = graph_path
         self.entity_aliases_path = entity_aliases_path
-        
+
+        # Write-ahead log of node/edge mutations between graph checkpoints
+        self._update_log_path = f"{os.path.splitext(graph_path)[0]}_updates.jsonl"
+        self._update_log_fh = None
+
         # Load existing graph and aliases
         self.load_graph(graph_path)
         self.load_entity_aliases(entity_aliases_path)
+
+        # In memory, edges are keyed by (source, target, relationship_type)
+        # tuples; the joined-string keys only exist in the serialized graph
+        self._edges = self._build_edge_index()
+
+        # Open the update log unbuffered so each update reaches the OS
+        # immediately, and checkpoint the graph when the program exits
+        self._update_log_fh = open(self._update_log_path, 'ab', buffering=0)
+        atexit.register(self.save_graph)
         
-        # Build name map
-        self.name_to_id_map = self.build_name_map()
+        # Build the name map, fuzzy-match blocking index, and scoring arrays
+        self._build_name_structures()
 
         # Initialize model and PubTator
         self.model = model
@@ -36,16 +61,20 @@ class KnowledgeGraphUpdater:
         """Load existing knowledge graph or create new if missing."""
         try:
             if os.path.exists(path) and os.path.getsize(path) > 0:
-                with open(path, 'r') as f:
-                    self.graph = json.load(f)
+                if os.path.getsize(path) > self.STREAM_PARSE_THRESHOLD:
+                    self.graph = self._stream_load_graph(path)
+                else:
+                    with open(path, 'rb') as f:
+                        self.graph = orjson.loads(f.read())
                 self.graph.setdefault("nodes", {})
                 self.graph.setdefault("edges", {})
                 logger.info(f"Successfully loaded knowledge graph from {path}")
+                self._replay_update_log()
             else:
                 logger.info(f"No existing graph found at {path}, initializing new graph")
                 os.makedirs(os.path.dirname(path), exist_ok=True)  # create directory if it doesn't exist
                 self.save_graph()
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Error reading knowledge graph file: {e}")
             logger.info("Initializing new graph")
             self.save_graph()
@@ -53,18 +82,33 @@ class KnowledgeGraphUpdater:
             logger.error(f"Unexpected error loading knowledge graph: {e}")
             self.save_graph()
             
+    @staticmethod
+    def _stream_load_graph(path: str) -> Dict:
+        """Incrementally parse a very large graph file one node/edge at a time."""
+        import ijson  # only needed for multi-GB graphs
+
+        logger.info(f"Graph file {path} is large; stream-parsing it")
+        graph = {"nodes": {}, "edges": {}}
+        with open(path, 'rb') as f:
+            for key, value in ijson.kvitems(f, 'nodes'):
+                graph["nodes"][key] = value
+        with open(path, 'rb') as f:
+            for key, value in ijson.kvitems(f, 'edges'):
+                graph["edges"][key] = value
+        return graph
+
     def load_entity_aliases(self, path: str) -> None:
         """Load known entity aliases or create new if missing."""
         try:
             if os.path.exists(path) and os.path.getsize(path) > 0:
-                with open(path, 'r') as f:
-                    self.entity_aliases = json.load(f)
+                with open(path, 'rb') as f:
+                    self.entity_aliases = orjson.loads(f.read())
                 logger.info(f"Successfully loaded entity aliases from {path}")
             else:
                 logger.info(f"No existing aliases found at {path}, initializing empty aliases")
                 os.makedirs(os.path.dirname(path), exist_ok=True)    # create directory if it doesn't exist
                 self.save_entity_aliases()
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Error reading entity aliases file: {e}")
             logger.info("Initializing empty aliases")
             self.save_entity_aliases()
@@ -72,32 +116,146 @@ class KnowledgeGraphUpdater:
             logger.error(f"Unexpected error loading entity aliases: {e}")
             self.save_entity_aliases()
 
+    def _build_edge_index(self) -> Dict:
+        """Key the loaded edges by (source, target, relationship_type) tuples.
+
+        Hashing a tuple of three short strings is cheaper than building and
+        hashing the concatenated key string on every lookup.
+        """
+        edges = {}
+        for edge in self.graph["edges"].values():
+            # Rebuild the paper-ID set used for O(1) duplicate-evidence checks
+            edge["_paper_id_set"] = {e["paper_id"] for e in edge["evidence"]}
+            edges[(edge["source_node"], edge["target_node"], edge["relationship_type"])] = edge
+        return edges
+
+    @staticmethod
+    def _edge_for_json(edge: Dict) -> Dict:
+        """Copy of an edge without the in-memory-only paper-ID set."""
+        return {k: v for k, v in edge.items() if k != "_paper_id_set"}
+
+    @staticmethod
+    def _edge_key_str(edge_key: tuple) -> str:
+        """Serialized (and externally reported) form of a tuple edge key."""
+        return "_".join(edge_key)
+
+    def has_edge(self, source_id: str, target_id: str, relationship_type: str) -> bool:
+        """Whether an edge already exists for this (source, target, relation)."""
+        return (source_id, target_id, relationship_type) in self._edges
+
     def save_graph(self) -> None:
-        """Save the current state of the knowledge graph."""
+        """Checkpoint the current state of the knowledge graph and clear the update log.
+
+        The checkpoint is written to a temp file and renamed into place so a
+        crash mid-write cannot destroy the previous checkpoint — the update
+        log only holds mutations since that checkpoint, so the old base must
+        survive until the new one is durably on disk. The log is truncated
+        only after the rename succeeds.
+        """
         try:
-            with open(self.graph_path, 'w') as f:
-                json.dump(self.graph, f, indent=2)
+            self.graph["edges"] = {self._edge_key_str(key): self._edge_for_json(edge) for key, edge in self._edges.items()}
+            tmp_path = f"{self.graph_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(orjson.dumps(self.graph))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.graph_path)
             logger.info(f"Successfully saved knowledge graph to {self.graph_path}")
+            # The checkpoint now holds everything the log recorded
+            if self._update_log_fh is not None:
+                self._update_log_fh.truncate(0)
         except Exception as e:
             logger.error(f"Error saving knowledge graph: {e}")
 
+    def _log_update(self, kind: str, key: str, value: Dict) -> None:
+        """Append a single node/edge mutation to the write-ahead log."""
+        if self._update_log_fh is None:
+            return
+        try:
+            self._update_log_fh.write(orjson.dumps({"kind": kind, "key": key, "value": value}) + b"\n")
+        except Exception as e:
+            logger.error(f"Error writing to update log: {e}")
+
+    def _replay_update_log(self) -> None:
+        """Re-apply updates logged after the last checkpoint (e.g. after a crash)."""
+        if not os.path.exists(self._update_log_path) or os.path.getsize(self._update_log_path) == 0:
+            return
+        replayed = 0
+        with open(self._update_log_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    logger.warning("Skipping corrupt line in update log")
+                    continue
+                if entry["kind"] == "node":
+                    self.graph["nodes"][entry["key"]] = entry["value"]
+                elif entry["kind"] == "edge":
+                    self.graph["edges"][entry["key"]] = entry["value"]
+                replayed += 1
+        if replayed:
+            logger.info(f"Replayed {replayed} logged updates from {self._update_log_path}")
+
     def save_entity_aliases(self) -> None:
         """Save the current state of entity aliases."""
         try:
-            with open(self.entity_aliases_path, 'w') as f:
-                json.dump(self.entity_aliases, f, indent=2)
+            with open(self.entity_aliases_path, 'wb') as f:
+                f.write(orjson.dumps(self.entity_aliases))
             logger.info(f"Successfully saved entity aliases to {self.entity_aliases_path}")
         except Exception as e:
             logger.error(f"Error saving entity aliases: {e}")
 
-    def build_name_map(self) -> Dict:
-        """Build mapping from all known names (including aliases) to node IDs."""
-        name_map = {}
+    @staticmethod
+    def _names_lower(properties: Dict) -> List[str]:
+        """All lowercased names of a node, cached on the node at first use."""
+        if "_primary_name_lower" not in properties:
+            properties["_primary_name_lower"] = properties["primary_name"].lower()
+            properties["_alternative_names_lower"] = [n.lower() for n in properties.get("alternative_names", [])]
+        return [properties["_primary_name_lower"]] + properties["_alternative_names_lower"]
+
+    def _build_name_structures(self) -> None:
+        """Rebuild every name lookup structure in a single pass over the nodes."""
+        self.name_to_id_map = {}
+        self._typed_trigram_index = {}
+        # Per-type parallel (lowered name, node ID) arrays; rapidfuzz scores a
+        # whole batch of queries against such an array in one C call
+        self._names_by_type = {}
+        self._node_ids_by_type = {}
         for node_id, node_data in self.graph["nodes"].items():
-            name_map[node_data["properties"]["primary_name"].lower()] = node_id
-            for alt_name in node_data["properties"].get("alternative_names", []):
-                name_map[alt_name.lower()] = node_id
-        return name_map
+            properties = node_data["properties"]
+            entity_type = properties["entity_type"]
+            for name_lower in self._names_lower(properties):
+                self._register_name(entity_type, name_lower, node_id)
+
+    def _register_name(self, entity_type: str, name_lower: str, node_id: str) -> None:
+        """Register an entity name in every lookup structure.
+
+        This is the single place that keeps name_to_id_map, the trigram
+        blocking index, and the per-type scoring arrays consistent; a name
+        missed by any of them silently falls through to the slow fuzzy path.
+        """
+        if self.name_to_id_map.get(name_lower) == node_id:
+            return
+        self.name_to_id_map[name_lower] = node_id
+        type_index = self._typed_trigram_index.setdefault(entity_type, {})
+        for trigram in _trigrams(name_lower):
+            type_index.setdefault(trigram, set()).add(node_id)
+        self._names_by_type.setdefault(entity_type, []).append(name_lower)
+        self._node_ids_by_type.setdefault(entity_type, []).append(node_id)
+
+    def _node_to_candidate(self, node_id: str) -> Dict:
+        """Build the candidate dict that disambiguation expects for a node."""
+        properties = self.graph["nodes"][node_id]["properties"]
+        return {
+            "entity_id": node_id,
+            "name": properties["primary_name"],
+            "type": properties["entity_type"],
+            "description": properties.get("description", ""),
+            "external_ids": properties.get("external_ids", {})
+        }
 
     def find_matching_entity(self, entity: EntityInfo, threshold: float = 0.5) -> Optional[str]:
         name_lower = entity.name.lower()
@@ -113,22 +271,37 @@ class KnowledgeGraphUpdater:
             else:
                 logger.warning(f"Type mismatch for entity '{entity.name}' (found type: {node_data['properties']['entity_type']})")
 
-        # Fuzzy match
+        # Fuzzy match, restricted to same-type nodes sharing >=1 trigram with the query
+        candidate_ids = set()
+        type_index = self._typed_trigram_index.get(entity_type, {})
+        for trigram in _trigrams(name_lower):
+            candidate_ids |= type_index.get(trigram, set())
+
+        shortlist_names = []
+        shortlist_ids = []
+        for node_id in candidate_ids:
+            for known_name_lower in self._names_lower(self.graph["nodes"][node_id]["properties"]):
+                shortlist_names.append(known_name_lower)
+                shortlist_ids.append(node_id)
+
+        # Score the whole shortlist in one C-level call (rapidfuzz scores are 0-100)
+        matches = process.extract(name_lower, shortlist_names, scorer=fuzz.ratio,
+                                  score_cutoff=threshold * 100, limit=None)
         candidate_entities = []
-        for node_id, node_data in self.graph["nodes"].items():
-            if node_data["properties"]["entity_type"] != entity_type:
-                continue
-            known_names = [node_data["properties"]["primary_name"].lower()] + \
-                          [alt_name.lower() for alt_name in node_data["properties"].get("alternative_names", [])]
-            for known_name in known_names:
-                similarity = SequenceMatcher(None, name_lower, known_name).ratio()
-                if similarity >= threshold:
-                    candidate_entities.append(node_id)
-                    break  # Avoid duplicates
-
-        # If multiple candidates, disambiguate
-        if candidate_entities:
-            match_id = self.model.disambiguate_entity(entity, candidate_entities)
+        seen = set()
+        for _, _, idx in matches:
+            node_id = shortlist_ids[idx]
+            if node_id not in seen:  # Avoid duplicates
+                seen.add(node_id)
+                candidate_entities.append(node_id)
+
+        return self._disambiguate_candidates(entity, candidate_entities)
+
+    def _disambiguate_candidates(self, entity: EntityInfo, candidate_node_ids: List[str]) -> Optional[str]:
+        """Pick among fuzzy-matched candidate nodes (via the LLM), or report no match."""
+        if candidate_node_ids:
+            candidates = [self._node_to_candidate(node_id) for node_id in candidate_node_ids]
+            match_id = self.model.disambiguate_entity(entity, candidates)
             if match_id:
                 logger.info(f"Disambiguation matched '{entity.name}' to node_id '{match_id}'")
                 return match_id
@@ -136,7 +309,53 @@ class KnowledgeGraphUpdater:
         logger.info(f"No match found for entity '{entity.name}'")
         return None
 
-    def create_node(self, entity_info: Dict) -> str:
+    def find_matching_entities_batch(self, entities: List[EntityInfo], threshold: float = 0.5) -> Dict:
+        """Resolve several entities against the graph at once.
+
+        Entities that miss the exact-match map are grouped by type and scored
+        against that type's full name array with a single process.cdist call
+        (a multi-threaded C matrix operation) instead of per-query Python
+        iteration. Returns {(name_lower, type): node_id or None}.
+        """
+        resolved = {}
+        fuzzy_by_type = {}
+        for entity in entities:
+            key = (entity.name.lower(), entity.type)
+            if key in resolved:
+                continue
+            node_id = self.name_to_id_map.get(key[0])
+            if node_id is not None and self.graph["nodes"][node_id]["properties"]["entity_type"] == entity.type:
+                logger.info(f"Exact match found for entity '{entity.name}' with node_id '{node_id}'")
+                resolved[key] = node_id
+            else:
+                fuzzy_by_type.setdefault(entity.type, {})[key[0]] = entity
+
+        for entity_type, queries in fuzzy_by_type.items():
+            known_names = self._names_by_type.get(entity_type, [])
+            known_node_ids = self._node_ids_by_type.get(entity_type, [])
+            query_entities = list(queries.values())
+            if not known_names:
+                for entity in query_entities:
+                    resolved[(entity.name.lower(), entity_type)] = None
+                continue
+            query_names = [entity.name.lower() for entity in query_entities]
+            scores = process.cdist(query_names, known_names, scorer=fuzz.ratio,
+                                   score_cutoff=threshold * 100, workers=-1)
+            for row, entity in zip(scores, query_entities):
+                candidate_node_ids = []
+                seen = set()
+                for idx in row.nonzero()[0]:  # scores below the cutoff are zeroed
+                    node_id = known_node_ids[idx]
+                    if node_id not in seen:
+                        seen.add(node_id)
+                        candidate_node_ids.append(node_id)
+                resolved[(entity.name.lower(), entity_type)] = self._disambiguate_candidates(entity, candidate_node_ids)
+
+        return resolved
+
+    def create_node(self, entity_info: Dict, now_iso: Optional[str] = None) -> str:
+        if now_iso is None:
+            now_iso = datetime.now().isoformat()
         # Final check for existing nodes before creation
         node_id = self.find_matching_entity(EntityInfo(**entity_info))
         if node_id:
@@ -149,20 +368,24 @@ class KnowledgeGraphUpdater:
             "properties": {
                 "entity_type": entity_info["type"],
                 "primary_name": entity_info["name"],
+                "_primary_name_lower": entity_info["name"].lower(),
                 "alternative_names": [],
+                "_alternative_names_lower": [],
                 "external_ids": entity_info.get("external_ids", {}),
                 "description": entity_info.get("description", ""),
-                "last_updated": datetime.now().isoformat(),
-                "creation_date": datetime.now().isoformat()
+                "last_updated": now_iso,
+                "creation_date": now_iso
             }
         }
-        # Add to name mapping
-        self.name_to_id_map[entity_info["name"].lower()] = node_id
+        self._register_name(entity_info["type"], entity_info["name"].lower(), node_id)
+        self._log_update("node", node_id, self.graph["nodes"][node_id])
         logger.info(f"Created new node '{node_id}' for entity '{entity_info['name']}'")
         return node_id
 
-    def update_node(self, node_id: str, entity_info: EntityInfo) -> None:
+    def update_node(self, node_id: str, entity_info: EntityInfo, now_iso: Optional[str] = None) -> None:
         """Update an existing node with new information from entity_info."""
+        if now_iso is None:
+            now_iso = datetime.now().isoformat()
         node = self.graph["nodes"][node_id]
         properties = node["properties"]
         # Update description if the new one is longer
@@ -176,25 +399,29 @@ class KnowledgeGraphUpdater:
             existing_external_ids.update(entity_info.external_ids)
             properties["external_ids"] = existing_external_ids
 
-        # Add alternative names
+        # Add alternative names (the lowered cache is kept in lockstep)
+        self._names_lower(properties)
         alternative_names = properties.get("alternative_names", [])
         if entity_info.name != properties["primary_name"] and entity_info.name not in alternative_names:
             alternative_names.append(entity_info.name)
+            properties["_alternative_names_lower"].append(entity_info.name.lower())
         properties["alternative_names"] = alternative_names
 
         # Update last_updated
-        properties["last_updated"] = datetime.now().isoformat()
-        # Update the name_to_id_map with the new alternative names
-        self.name_to_id_map[entity_info.name.lower()] = node_id
+        properties["last_updated"] = now_iso
+        self._register_name(entity_info.type, entity_info.name.lower(), node_id)
+        self._log_update("node", node_id, node)
 
-    def create_update_edge(self, source_id: str, target_id: str, relation_info: Dict) -> str:
+    def create_update_edge(self, source_id: str, target_id: str, relation_info: Dict, now_iso: Optional[str] = None) -> str:
         """Create new edge or update existing one with new evidence."""
+        if now_iso is None:
+            now_iso = datetime.now().isoformat()
         # Create unique edge identifier
-        edge_key = f"{source_id}_{target_id}_{relation_info['relationship_type']}"
-        
-        if edge_key not in self.graph["edges"]:
+        edge_key = (source_id, target_id, relation_info['relationship_type'])
+
+        if edge_key not in self._edges:
             # Create new edge
-            self.graph["edges"][edge_key] = {
+            self._edges[edge_key] = {
                 "type": "string",
                 "source_node": source_id,
                 "target_node": target_id,
@@ -207,7 +434,8 @@ class KnowledgeGraphUpdater:
                     "evidence_strength": 0.0,
                     "contradictory_evidence": False
                 },
-                "last_updated": datetime.now().isoformat()
+                "last_updated": now_iso,
+                "_paper_id_set": set()
             }
         
         # add new evidence
@@ -218,92 +446,130 @@ class KnowledgeGraphUpdater:
             "statistical_evidence": relation_info.get("statistical_evidence", {}),
             "extracted_text": relation_info["extracted_text"],
             "extraction_confidence": relation_info["confidence"],
-            "last_verified": datetime.now().isoformat()
+            "last_verified": now_iso
         }
         
         # check for duplicate evidence
         if not self._is_duplicate_evidence(edge_key, evidence):
-            self.graph["edges"][edge_key]["evidence"].append(evidence)
-            self._update_edge_metadata(edge_key)
-        
-        return edge_key
+            edge = self._edges[edge_key]
+            edge["evidence"].append(evidence)
+            edge["_paper_id_set"].add(evidence["paper_id"])
+            self._update_edge_metadata(edge_key, evidence, now_iso)
+            self._log_update("edge", self._edge_key_str(edge_key), self._edge_for_json(edge))
+
+        return self._edge_key_str(edge_key)
 
-    def _is_duplicate_evidence(self, edge_key: str, new_evidence: Dict) -> bool:
+    def _is_duplicate_evidence(self, edge_key: tuple, new_evidence: Dict) -> bool:
         """Check if this evidence is already recorded for the given edge."""
-        existing_evidences = self.graph["edges"][edge_key]["evidence"]
-        for ev in existing_evidences:
-            if ev["paper_id"] == new_evidence["paper_id"]:
-                return True
-        return False
-
-    def _update_edge_metadata(self, edge_key: str):
-        """Update aggregated metadata for the given edge."""
-        edge = self.graph["edges"][edge_key]
-        evidences = edge["evidence"]
-        
-        years = [e["citation_metadata"]["year"] for e in evidences if e["citation_metadata"]["year"]]
-        earliest = min(years) if years else None
-        latest = max(years) if years else None
-        
-        edge["aggregated_metadata"].update({
-            "total_papers": len(evidences),
-            "earliest_evidence": earliest,
-            "latest_evidence": latest,
-            "evidence_strength": float(np.mean([e["extraction_confidence"] for e in evidences])),
-            "last_updated": datetime.now().isoformat()
-        })
+        return new_evidence["paper_id"] in self._edges[edge_key]["_paper_id_set"]
 
-    def process_abstract(self, abstract_info: Dict) -> List[Dict]:
-        try:
-            # 1: Extract entities and relationships with LLM
-            entities, relations = self.model.process_abstract(abstract_info)
+    def _update_edge_metadata(self, edge_key: tuple, new_evidence: Dict, now_iso: Optional[str] = None):
+        """Fold a single new piece of evidence into the edge's aggregated metadata."""
+        if now_iso is None:
+            now_iso = datetime.now().isoformat()
+        edge = self._edges[edge_key]
+        metadata = edge["aggregated_metadata"]
+
+        # Backfill the running aggregates for edges created before they existed
+        if "_conf_sum" not in metadata:
+            prior_evidences = edge["evidence"][:-1]
+            metadata["_conf_sum"] = float(sum(e["extraction_confidence"] for e in prior_evidences))
+            metadata["_conf_count"] = len(prior_evidences)
+
+        metadata["_conf_sum"] += new_evidence["extraction_confidence"]
+        metadata["_conf_count"] += 1
+        metadata["total_papers"] = len(edge["evidence"])
+        metadata["evidence_strength"] = metadata["_conf_sum"] / metadata["_conf_count"]
+
+        year = new_evidence["citation_metadata"]["year"]
+        if year:
+            if metadata["earliest_evidence"] is None or year < metadata["earliest_evidence"]:
+                metadata["earliest_evidence"] = year
+            if metadata["latest_evidence"] is None or year > metadata["latest_evidence"]:
+                metadata["latest_evidence"] = year
+
+        metadata["last_updated"] = now_iso
+
+    def extract_abstract(self, abstract_info: Dict) -> tuple:
+        """Run the I/O-bound extraction (LLM + PubTator) for one abstract.
+
+        Does not touch the graph, so it is safe to run concurrently for
+        several abstracts at once.
+        """
+        # 1: Extract entities and relationships with LLM
+        entities, relations = self.model.process_abstract(abstract_info)
+        logger.info(f"Extracted {len(entities)} entities and {len(relations)} relationships.")
+
+        # 2: PubTator normalization
+        self._normalize_entities(entities)
+
+        # Validate Relationships (commented out/optional for now)
+        # for relation in relations:
+        #     source_id = relation.source_entity.external_ids.get("PubTatorID")
+        #     target_id = relation.target_entity.external_ids.get("PubTatorID")
+        #     if source_id and target_id:
+        #         # Validate using PubTator relations
+        #         pass
+
+        return entities, relations
+
+    def extract_abstracts_batch(self, abstracts_info: List[Dict]) -> List[tuple]:
+        """Run the I/O-bound extraction for a batch of abstracts with one LLM call.
+
+        Like extract_abstract, this does not touch the graph.
+        """
+        extractions = self.model.process_abstracts_batch(abstracts_info)
+        for entities, relations in extractions:
             logger.info(f"Extracted {len(entities)} entities and {len(relations)} relationships.")
+            self._normalize_entities(entities)
+        return extractions
 
-            # 2: PubTator normalization
-            for ent in entities:
-                logger.debug(f"Looking up PubTator ID for entity: {ent.name}")
-                try:
-                    entity_ids = self.pubtator_api.find_entity_id(ent.name)
-                    if entity_ids:
-                        ent.external_ids = ent.external_ids or {}
-                        ent.external_ids["PubTatorID"] = entity_ids[0]
-                        print()
-                        logger.debug(f"Found PubTator ID {entity_ids[0]} for {ent.name}")
-                except Exception as e:
-                    logger.warning(f"Failed to fetch PubTator ID for {ent.name}: {e}")
-            
-            # Validate Relationships (commented out/optional for now)
-            # for relation in relations:
-            #     source_id = relation.source_entity.external_ids.get("PubTatorID")
-            #     target_id = relation.target_entity.external_ids.get("PubTatorID")
-            #     if source_id and target_id:
-            #         # Validate using PubTator relations
-            #         pass
+    def _normalize_entities(self, entities: List[EntityInfo]) -> None:
+        """Attach PubTator IDs to extracted entities where available."""
+        if not entities:
+            return
+        unique_names = list({ent.name for ent in entities})
+        logger.debug(f"Looking up PubTator IDs for {len(unique_names)} unique entities")
+        id_map = self.pubtator_api.find_entity_ids_batch(unique_names)
+        for ent in entities:
+            entity_ids = id_map.get(ent.name)
+            if entity_ids:
+                ent.external_ids = ent.external_ids or {}
+                ent.external_ids["PubTatorID"] = entity_ids[0]
+                logger.debug(f"Found PubTator ID {entity_ids[0]} for {ent.name}")
 
-            updates = []
+    def apply_extraction(self, abstract_info: Dict, entities: List[EntityInfo], relations: List[RelationInfo]) -> List[Dict]:
+        """Apply an extraction result to the graph. Must run single-threaded."""
+        try:
+            # One timestamp for every mutation this abstract produces
+            now_iso = datetime.now().isoformat()
+
+            # The same entity usually appears in several relations (as source
+            # and/or target); resolve each unique (name, type) exactly once
+            unique_entities = {}
             for relation in relations:
-                # process source entity
-                source_entity = relation.source_entity
-                source_id = self.find_matching_entity(source_entity)
-                if source_id:
-                    self.update_node(source_id, source_entity)
+                for entity in (relation.source_entity, relation.target_entity):
+                    unique_entities.setdefault((entity.name.lower(), entity.type), entity)
+
+            resolved = self.find_matching_entities_batch(list(unique_entities.values()))
+            entity_ids = {}
+            for key, entity in unique_entities.items():
+                node_id = resolved.get(key)
+                if node_id:
+                    self.update_node(node_id, entity, now_iso)
                 else:
-                    source_id = self.create_node(source_entity.__dict__)
+                    node_id = self.create_node(asdict(entity), now_iso)
+                entity_ids[key] = node_id
 
-                # process entity in question
+            updates = []
+            for relation in relations:
+                source_entity = relation.source_entity
                 target_entity = relation.target_entity
-                target_id = self.find_matching_entity(target_entity)
-                if target_id:
-                    self.update_node(target_id, target_entity)
-                else:
-                    target_id = self.create_node(target_entity.__dict__)
+                source_id = entity_ids[(source_entity.name.lower(), source_entity.type)]
+                target_id = entity_ids[(target_entity.name.lower(), target_entity.type)]
 
                 # create or update the edge
-                print('################')
-                logger.debug(f"abstract_info: {abstract_info} (type: {type(abstract_info)})")
-                print(abstract_info, type(abstract_info))
-                print('################')
-
+                edge_existed = self.has_edge(source_id, target_id, relation.relationship_type)
                 edge_id = self.create_update_edge(source_id, target_id, {
                     "relationship_type": relation.relationship_type,
                     "paper_id": abstract_info["pmid"],
@@ -316,21 +582,23 @@ class KnowledgeGraphUpdater:
                     "experimental_context": relation.context,
                     "extracted_text": relation.supporting_text,
                     "confidence": relation.confidence
-                })
+                }, now_iso)
 
                 updates.append({
                     "edge_id": edge_id,
                     "source_id": source_id,
                     "target_id": target_id,
-                    "action": "updated" if edge_id in self.graph["edges"] else "created"
+                    "action": "updated" if edge_existed else "created"
                 })
 
             return updates
 
         except Exception as e:
-            print('################')
             logger.debug(f"abstract_info: {abstract_info} (type: {type(abstract_info)})")
-            print(abstract_info, type(abstract_info))
-            print('################')
             logger.error(f"Error processing abstract {abstract_info.get('pmid', 'unknown')}: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def process_abstract(self, abstract_info: Dict) -> List[Dict]:
+        """Extract one abstract and apply the result to the graph."""
+        entities, relations = self.extract_abstract(abstract_info)
+        return self.apply_extraction(abstract_info, entities, relations)
\ No newline at end of file
@@ -1,26 +1,33 @@
 import os
 import re
-import json
+import atexit
 import logging
+import queue
+import threading
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
-import jsonschema
+from concurrent.futures import ThreadPoolExecutor
+import fastjsonschema
+import orjson
 import time
-from difflib import SequenceMatcher
+from rapidfuzz import fuzz, process, utils
 
 from cerebras.cloud.sdk import Cerebras
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Matches a JSON object wrapped in a ```json code fence
+_JSON_FENCE_RE = re.compile(r'```json\s*(\{.*?\})\s*```', re.DOTALL)
+
+@dataclass(slots=True)
 class EntityInfo:
     name: str
     type: str
     description: Optional[str] = None
     external_ids: Optional[Dict[str, str]] = None
 
-@dataclass
+@dataclass(slots=True)
 class RelationInfo:
     source_entity: EntityInfo
     target_entity: EntityInfo
@@ -42,34 +49,15 @@ and extract exclusively biomedical entities and their relationships of the desig
 8. Do not infer relationships not stated in the abstract
 9. Include any available entity identifiers (UMLS, etc.) that you have found from external sources and specify
 
-Output must be in this exact format:
-{
-    "entities": [
-        {
-            "name": "entity_name",
-            "type": "entity_type",
-            "description": "brief description",
-            "external_ids": {"system": "id"}
-        }
-    ],
-    "relations": [
-        {
-            "source_entity": {entity object},
-            "target_entity": {entity object},
-            "relationship_type": "type",
-            "context": {
-                "study_type": "type",
-                "model_system": {"type": "system", "details": "details"},
-                "methods": ["method1", "method2"]
-            },
-            "supporting_text": "exact text from abstract",
-            "confidence": 0.95
-        }
-    ]
-}
+Output a single JSON object with exactly two keys:
+- "entities": list of {"name", "type", "description", "external_ids": {"system": "id"}}
+- "relations": list of {"source_entity": entity object, "target_entity": entity object, "relationship_type", "context": {"study_type", "model_system": {"type", "details"}, "methods": [...]}, "supporting_text": exact text from abstract, "confidence": 0-1}
 """
 
 class CerebrasInference:
+    # Class-level flag so repeated instantiations don't re-stat the log dir
+    _log_dir_ensured = False
+
     def __init__(self, model: str, api_key=None):
         self.model = model
         self.api_key = api_key or os.environ.get("CEREBRAS_API_KEY")
@@ -104,31 +92,50 @@ class CerebrasInference:
                 "supporting_text": {"type": "string"},
                 "confidence": {"type": "number"}
             },
-            "required": ["source_entity", "target_entity", "relationship_type", 
+            "required": ["source_entity", "target_entity", "relationship_type",
                          "context", "supporting_text", "confidence"]
         }
 
-        # Log file path for API calls
-        self.api_log_path = "./logs/api_calls_log.ndjson"
-        os.makedirs(os.path.dirname(self.api_log_path), exist_ok=True)
+        # fastjsonschema code-generates a straight-line validator function
+        # per schema, so the hot path does no schema traversal at all
+        self._entity_validator = fastjsonschema.compile(self.entity_schema)
+        self._relation_validator = fastjsonschema.compile(self.relation_schema)
 
-    def chat_completion(self, messages: List[Dict]) -> str:
+        # Memoized disambiguation results keyed on (name, type, candidate set)
+        self._disambiguation_cache = {}
+
+        # Log file path for API calls. Entries are queued and written by one
+        # background thread so API calls never block on file I/O, and the
+        # single writer keeps the NDJSON lines intact under concurrency.
+        self.api_log_path = "./logs/api_calls_log.ndjson"
+        if not CerebrasInference._log_dir_ensured:
+            os.makedirs(os.path.dirname(self.api_log_path), exist_ok=True)
+            CerebrasInference._log_dir_ensured = True
+        self._log_fh = open(self.api_log_path, 'ab', buffering=1 << 16)
+        self._log_queue = queue.Queue()
+        self._log_thread = threading.Thread(target=self._drain_log_queue, daemon=True)
+        self._log_thread.start()
+        atexit.register(self._close_log)
+
+    def chat_completion(self, messages: List[Dict], max_tokens: int = 2000, temperature: float = 0.3) -> str:
         """
         Sends a list of messages to the Cerebras LLM and returns the response content.
 
         Args:
             messages (list): List of message dictionaries with 'role' and 'content'.
+            max_tokens (int): Generation ceiling; decode time scales with it,
+                so call sites with short outputs should pass a small value.
+            temperature (float): Sampling temperature.
 
         Returns:
             str: The content of the LLM's response.
         """
         try:
-            # temperature and max_tokens can vary
             response = self.client.chat.completions.create(
                 messages=messages,
                 model=self.model,
-                temperature=0.3,
-                max_tokens=2000
+                temperature=temperature,
+                max_tokens=max_tokens
             )
             content = response.choices[0].message.content.strip()
             logger.debug(f"Cerebras LLM response: {content}")
@@ -153,36 +160,54 @@ class CerebrasInference:
             log_entry["fix_attempt"] = True
             log_entry["previous_extraction"] = previous_extraction
 
-        # Append log entry as a line in NDJSON format
+        # Hand the entry to the background writer; serialization and the
+        # file write happen off the hot path
+        self._log_queue.put(log_entry)
+
+    def _drain_log_queue(self) -> None:
+        """Write queued log entries to the NDJSON file (runs in a daemon thread)."""
+        while True:
+            log_entry = self._log_queue.get()
+            if log_entry is None:
+                break
+            try:
+                self._log_fh.write(orjson.dumps(log_entry) + b"\n")
+            except Exception as e:
+                logger.error(f"Failed to log API response: {e}")
+            finally:
+                self._log_queue.task_done()
+
+    def _close_log(self) -> None:
+        """Flush any queued log entries and close the log file."""
+        self._log_queue.put(None)
+        self._log_thread.join(timeout=5)
         try:
-            with open(self.api_log_path, 'a') as f:
-                f.write(json.dumps(log_entry) + "\n")
-            logger.info(f"API response logged to {self.api_log_path}")
+            self._log_fh.close()
         except Exception as e:
-            logger.error(f"Failed to log API response: {e}")
+            logger.error(f"Failed to close API log: {e}")
 
     def _validate_entity(self, entity: Dict) -> bool:
         """Validate entity against schema."""
         try:
-            jsonschema.validate(instance=entity, schema=self.entity_schema)
+            self._entity_validator(entity)
             return True
-        except jsonschema.exceptions.ValidationError as e:
+        except fastjsonschema.JsonSchemaException as e:
             logger.warning(f"Entity validation failed: {e}")
             return False
 
     def _validate_relation(self, relation: Dict) -> bool:
         """Validate relation against schema."""
         try:
-            jsonschema.validate(instance=relation, schema=self.relation_schema)
+            self._relation_validator(relation)
             return True
-        except jsonschema.exceptions.ValidationError as e:
+        except fastjsonschema.JsonSchemaException as e:
             logger.warning(f"Relation validation failed: {e}")
             return False
 
     def _fix_extraction(self, extraction: Dict, abstract_info: Dict) -> Dict:
         fix_prompt = f"""The previous extraction was invalid. Please fix this extraction to match the required format:
 
-        Previous extraction: {json.dumps(extraction, indent=2)}
+        Previous extraction: {orjson.dumps(extraction, option=orjson.OPT_INDENT_2).decode()}
         
         Original abstract:
         Title: {abstract_info['title']}
@@ -196,13 +221,14 @@ class CerebrasInference:
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": fix_prompt}
         ]
-        response_content = self.chat_completion(messages)
+        # The fixed extraction is at most a reshape of the input slice
+        response_content = self.chat_completion(messages, max_tokens=1500)
         self._log_api_response(response_content, abstract_info, start_time, messages, fix_attempt=True, previous_extraction=extraction)
 
         try:
-            fixed_result = json.loads(response_content.strip())
+            fixed_result = orjson.loads(response_content.strip())
             return fixed_result
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             raise ValueError("Unable to fix extraction format")
 
     def process_abstract(self, abstract_info: Dict) -> Tuple[List[EntityInfo], List[RelationInfo]]:
@@ -227,38 +253,78 @@ class CerebrasInference:
         response_content = self.chat_completion(messages)
         self._log_api_response(response_content, abstract_info, start_time, messages)
 
-        # Parse response
+        extraction = self._parse_json_response(response_content)
+        extraction = self._validate_extraction(extraction, abstract_info)
+        return self._extraction_to_dataclasses(extraction)
+
+    def _parse_json_response(self, response_content: str) -> Dict:
+        """Parse an LLM response into a dict, handling code-fenced JSON."""
         try:
-            # Attempt to extract JSON block if wrapped in code fences
-            json_block_pattern = re.compile(r'```json\s*(\{.*?\})\s*```', re.DOTALL)
-            match = json_block_pattern.search(response_content)
-            if match:
-                json_str = match.group(1)
-            else:
-                json_str = response_content
-            extraction = json.loads(json_str.strip())
-        except json.JSONDecodeError as e:
+            json_str = response_content.strip()
+            # Raw JSON is the common case; only fall back to the fence regex
+            # when the response is actually wrapped
+            if not json_str.startswith('{') and '```json' in json_str:
+                match = _JSON_FENCE_RE.search(json_str)
+                if match:
+                    json_str = match.group(1)
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON parsing error: {e}")
             raise ValueError("Invalid JSON response from LLM")
 
-        # Validate extracted data
-        attempts = 0
-        while attempts < 3:
-            entities_valid = all(self._validate_entity(ent) for ent in extraction.get("entities", []))
-            relations_valid = all(self._validate_relation(rel) for rel in extraction.get("relations", []))
-
-            if entities_valid and relations_valid:
-                break
-            attempts += 1
-            extraction = self._fix_extraction(extraction, abstract_info)
+    def _validate_extraction(self, extraction: Dict, abstract_info: Dict) -> Dict:
+        """Validate an extraction against the schemas, asking the LLM to fix it if needed.
 
-        if attempts == 3:
-            if not entities_valid:
-                raise ValueError(f"Validation failed: Unable to validate entities after {len(attempts)} attempts")
-            elif not relations_valid:
-                raise ValueError(f"Validation failed: Unable to validate relations after {len(attempts)} attempts")
+        Only the items that fail validation are sent back for fixing; items
+        that already passed are kept as-is and never re-validated.
+        """
+        bad_entities = [i for i, ent in enumerate(extraction.get("entities", []))
+                        if not self._validate_entity(ent)]
+        bad_relations = [i for i, rel in enumerate(extraction.get("relations", []))
+                         if not self._validate_relation(rel)]
 
-        # Convert to dataclass instances
+        attempts = 0
+        while (bad_entities or bad_relations) and attempts < 3:
+            attempts += 1
+            invalid_slice = {
+                "entities": [extraction["entities"][i] for i in bad_entities],
+                "relations": [extraction["relations"][i] for i in bad_relations]
+            }
+            fixed = self._fix_extraction(invalid_slice, abstract_info)
+
+            # Merge fixed items back by position, keeping only those that now pass
+            fixed_entities = fixed.get("entities", [])
+            still_bad = []
+            for pos, i in enumerate(bad_entities):
+                if pos < len(fixed_entities) and self._validate_entity(fixed_entities[pos]):
+                    extraction["entities"][i] = fixed_entities[pos]
+                else:
+                    still_bad.append(i)
+            bad_entities = still_bad
+
+            fixed_relations = fixed.get("relations", [])
+            still_bad = []
+            for pos, i in enumerate(bad_relations):
+                if pos < len(fixed_relations) and self._validate_relation(fixed_relations[pos]):
+                    extraction["relations"][i] = fixed_relations[pos]
+                else:
+                    still_bad.append(i)
+            bad_relations = still_bad
+
+        if bad_entities:
+            raise ValueError(f"Validation failed: Unable to validate entities after {attempts} attempts")
+        if bad_relations:
+            raise ValueError(f"Validation failed: Unable to validate relations after {attempts} attempts")
+
+        return extraction
+
+    def _extraction_to_dataclasses(self, extraction: Dict) -> Tuple[List[EntityInfo], List[RelationInfo]]:
+        """Convert a validated extraction dict into dataclass instances.
+
+        Relation endpoints reuse the EntityInfo objects built from the entity
+        list where names match, so an entity mentioned in several relations is
+        one shared instance rather than a fresh copy per mention.
+        """
         entities_info = [
             EntityInfo(
                 name=e['name'],
@@ -267,21 +333,23 @@ class CerebrasInference:
                 external_ids=e.get('external_ids')
             ) for e in extraction.get("entities", [])
         ]
+        ent_map = {(e.name, e.type): e for e in entities_info}
+
+        def to_entity(e: Dict) -> EntityInfo:
+            existing = ent_map.get((e['name'], e['type']))
+            if existing is not None:
+                return existing
+            return EntityInfo(
+                name=e['name'],
+                type=e['type'],
+                description=e.get('description'),
+                external_ids=e.get('external_ids')
+            )
 
         relations_info = [
             RelationInfo(
-                source_entity=EntityInfo(
-                    name=r['source_entity']['name'],
-                    type=r['source_entity']['type'],
-                    description=r['source_entity'].get('description'),
-                    external_ids=r['source_entity'].get('external_ids')
-                ),
-                target_entity=EntityInfo(
-                    name=r['target_entity']['name'],
-                    type=r['target_entity']['type'],
-                    description=r['target_entity'].get('description'),
-                    external_ids=r['target_entity'].get('external_ids')
-                ),
+                source_entity=to_entity(r['source_entity']),
+                target_entity=to_entity(r['target_entity']),
                 relationship_type=r['relationship_type'],
                 context=r['context'],
                 supporting_text=r['supporting_text'],
@@ -291,11 +359,147 @@ class CerebrasInference:
 
         return entities_info, relations_info
 
+    def process_abstracts_batch(self, abstracts_info: List[Dict]) -> List[Tuple[List[EntityInfo], List[RelationInfo]]]:
+        """
+        Extract entities and relationships for several abstracts with a single LLM call.
+
+        Batching amortizes the per-request overhead (network round-trip, prompt
+        prefill) across the batch. Falls back to one call per abstract if the
+        batched response cannot be parsed.
+
+        Args:
+            abstracts_info (list): Abstract dicts as accepted by process_abstract.
+
+        Returns:
+            list: One (entities, relations) tuple per abstract, in input order.
+        """
+        if len(abstracts_info) == 1:
+            return [self.process_abstract(abstracts_info[0])]
+
+        pmids = [a.get('pmid', 'N/A') for a in abstracts_info]
+        logger.info(f"Processing batch of {len(abstracts_info)} abstracts (PMIDs: {pmids})")
+
+        abstract_blocks = "\n\n".join(
+            f"""Abstract {idx + 1}:
+        Title: {a['title']}
+        Abstract: {a['abstract']}
+        Journal: {a['journal']}
+        Year: {a['year']}"""
+            for idx, a in enumerate(abstracts_info)
+        )
+
+        user_prompt = f"""Analyze each of the following {len(abstracts_info)} biomedical abstracts and extract biomedical entities and their relationships:
+
+        {abstract_blocks}
+
+        Return a single JSON object of the form {{"results": [extraction_1, extraction_2, ...]}} where
+        extraction_i is the extraction for Abstract i in the exact JSON format specified, in the same order."""
+
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        start_time = time.time()
+        response_content = self.chat_completion(messages)
+        self._log_api_response(response_content, {"batch_pmids": pmids}, start_time, messages)
+
+        try:
+            parsed = self._parse_json_response(response_content)
+            results = parsed.get("results")
+            if not isinstance(results, list) or len(results) != len(abstracts_info):
+                raise ValueError(f"Expected {len(abstracts_info)} results, got {results if results is None else len(results)}")
+        except ValueError as e:
+            # Batched response unusable; retry each abstract individually
+            logger.warning(f"Batch extraction failed ({e}), falling back to per-abstract calls")
+            return [self.process_abstract(a) for a in abstracts_info]
+
+        extractions = []
+        for abstract_info, extraction in zip(abstracts_info, results):
+            try:
+                extraction = self._validate_extraction(extraction, abstract_info)
+                extractions.append(self._extraction_to_dataclasses(extraction))
+            except ValueError:
+                # One unfixable extraction must not discard its batchmates:
+                # retry this abstract on its own, and yield an empty
+                # extraction if the retry fails too
+                pmid = abstract_info.get('pmid', 'N/A')
+                logger.warning(f"Batched extraction for PMID {pmid} failed validation, retrying individually")
+                try:
+                    extractions.append(self.process_abstract(abstract_info))
+                except Exception as e:
+                    logger.error(f"Individual retry for PMID {pmid} failed: {e}")
+                    extractions.append(([], []))
+        return extractions
+
+    def process_abstracts(self, abstracts_info: List[Dict], concurrency: int = 16) -> List[Tuple[List[EntityInfo], List[RelationInfo]]]:
+        """
+        Extract entities and relationships for many abstracts concurrently.
+
+        Each abstract still gets its own request, but up to `concurrency`
+        requests are in flight at once, so wall time is bounded by the slowest
+        request rather than the sum of all round-trips. Use this instead of
+        process_abstracts_batch when per-abstract responses must be isolated.
+
+        Args:
+            abstracts_info (list): Abstract dicts as accepted by process_abstract.
+            concurrency (int): Maximum number of simultaneous API requests.
+
+        Returns:
+            list: One (entities, relations) tuple per abstract, in input order.
+        """
+        if not abstracts_info:
+            return []
+        if len(abstracts_info) == 1:
+            return [self.process_abstract(abstracts_info[0])]
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(abstracts_info))) as executor:
+            return list(executor.map(self.process_abstract, abstracts_info))
+
     def disambiguate_entity(self, new_entity: EntityInfo, candidate_entities: List[Dict]) -> Optional[str]:
         """
         Determine if the new entity matches any of the candidate entities.
         Return the entity_id of the matching entity, or None if no match.
         """
+        # LLM-returned names repeat heavily across abstracts (same gene
+        # symbols, same chemicals), so memoize on the query and candidate set
+        cache_key = (new_entity.name.lower(), new_entity.type,
+                     tuple(sorted(c['entity_id'] for c in candidate_entities)))
+        if cache_key in self._disambiguation_cache:
+            return self._disambiguation_cache[cache_key]
+
+        # Exact signals settle many queries without the model: a shared
+        # external ID, or an identical case-folded name of the same type
+        new_ids = new_entity.external_ids or {}
+        if new_ids:
+            id_index = {
+                (system, ext_id): candidate['entity_id']
+                for candidate in candidate_entities
+                for system, ext_id in (candidate.get('external_ids') or {}).items()
+            }
+            for system, ext_id in new_ids.items():
+                match = id_index.get((system, ext_id))
+                if match:
+                    self._disambiguation_cache[cache_key] = match
+                    return match
+        typed_candidates = [c for c in candidate_entities if c['type'] == new_entity.type]
+        name_index = {c['name'].casefold(): c['entity_id'] for c in typed_candidates}
+        match = name_index.get(new_entity.name.casefold())
+        if match:
+            self._disambiguation_cache[cache_key] = match
+            return match
+
+        # Near-exact spellings (hyphenation, spacing, trivial variants) are
+        # also safe to accept without the model
+        if typed_candidates:
+            hit = process.extractOne(new_entity.name, [c['name'] for c in typed_candidates],
+                                     scorer=fuzz.WRatio, processor=utils.default_process,
+                                     score_cutoff=92)
+            if hit:
+                match = typed_candidates[hit[2]]['entity_id']
+                self._disambiguation_cache[cache_key] = match
+                return match
+
         logger.info(f"Disambiguating entity: {new_entity.name} using Cerebras Inference")
 
         prompt = """You are an expert biomedical entity resolver. 
@@ -309,15 +513,25 @@ class CerebrasInference:
         Return answer in JSON:
         {"match": "entity_id"} or {"match": "No Match"}
         """
-        
+
+        # One serialization pass over a precomposed list, and compact JSON:
+        # indentation only adds tokens the model has to read
+        candidates_payload = [
+            {
+                'entity_id': candidate['entity_id'],
+                'name': candidate['name'],
+                'type': candidate['type'],
+                'description': candidate.get('description', ''),
+                'external_ids': candidate.get('external_ids', {})
+            }
+            for candidate in candidate_entities
+        ]
         user_message = {
             "role": "user",
-            "content": prompt.format(
-                new_entity=json.dumps(new_entity.__dict__, indent=2),
-                candidate_entities="\n".join([
-                    f"{idx+1}.\n{json.dumps({'entity_id': candidate['entity_id'], 'name': candidate['name'], 'type': candidate['type'], 'description': candidate.get('description', ''), 'external_ids': candidate.get('external_ids', {})}, indent=2)}"
-                    for idx, candidate in enumerate(candidate_entities)
-                ])
+            "content": (
+                f"{prompt}\n"
+                f"New entity:\n{orjson.dumps(new_entity).decode()}\n\n"
+                f"Candidate entities:\n{orjson.dumps(candidates_payload).decode()}"
             )
         }
 
@@ -327,15 +541,18 @@ class CerebrasInference:
         ]
 
         start_time = time.time()  # Start timing the API call
-        response_content = self.chat_completion(messages)
+        # The answer is a one-line JSON object; don't pay for a 2000-token ceiling
+        response_content = self.chat_completion(messages, max_tokens=64)
         self._log_api_response(response_content, {"disambiguation": True}, start_time, messages)
 
+        match = None
         try:
-            result = json.loads(response_content.strip())
-            match = result.get("match")
-            if match and match != "No Match":
-                return match
-        except json.JSONDecodeError:
+            result = orjson.loads(response_content.strip())
+            answer = result.get("match")
+            if answer and answer != "No Match":
+                match = answer
+        except orjson.JSONDecodeError:
             logger.error("Failed to parse disambiguation response as JSON")
 
-        return None
\ No newline at end of file
+        self._disambiguation_cache[cache_key] = match
+        return match
\ No newline at end of file
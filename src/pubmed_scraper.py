@@ -1,23 +1,74 @@
+import io
 import os
-import json
 import time
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import orjson
+import requests
+import xml.etree.ElementTree as ET
 from Bio import Entrez
-from Bio import Medline
+
+from src.ratelimit import RateLimiter
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EUTILS_EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+
+# NCBI credentials resolved once at import; they don't change mid-run
+_ENTREZ_EMAIL = os.environ.get("ENTREZ_EMAIL")
+_ENTREZ_API_KEY = os.environ.get("ENTREZ_API_KEY")  # optional, raises rate limits
+
+def _efetch_batch(session, retstart, retmax, webenv, query_key, email, api_key, rate_limiter) -> List[Dict]:
+    """Fetch one window of history-server results from efetch and parse the article XML.
+
+    The search results live on NCBI's history server, so each request only
+    carries an offset and a count rather than a list of PMIDs. The XML is
+    walked with ET.iterparse (C expat parser) and each <PubmedArticle>
+    element is freed as soon as it has been extracted, so parsing stays
+    O(one article) in memory regardless of batch size.
+    """
+    params = {
+        "db": "pubmed",
+        "WebEnv": webenv,
+        "query_key": query_key,
+        "retstart": retstart,
+        "retmax": retmax,
+        "rettype": "xml",
+        "retmode": "xml",
+        "email": email
+    }
+    if api_key:
+        params["api_key"] = api_key
+    for _attempt in range(3):
+        rate_limiter.acquire()
+        response = session.get(EUTILS_EFETCH_URL, params=params, timeout=30)
+        if response.status_code != 429:
+            break
+        # NCBI says when to come back; honor it instead of guessing
+        time.sleep(float(response.headers.get("Retry-After", 1)))
+    response.raise_for_status()
+
+    articles = []
+    for _, elem in ET.iterparse(io.BytesIO(response.content)):
+        if elem.tag == 'PubmedArticle':
+            article = parse_pubmed_article(elem)
+            if article:
+                articles.append(article)
+            elem.clear()
+    return articles
+
 def fetch_pubmed_articles(
     start_date: str,
     end_date: str,
     max_articles: int = 100
-    ) -> List[Dict]:
+    ) -> Iterator[Dict]:
     """
-    Fetches PubMed articles within a date range.
+    Fetches PubMed articles within a date range, yielding them as batches
+    complete so callers can stream results instead of holding the corpus.
 
     Args:
         start_date (str): Start date in format 'YYYY/MM/DD'.
@@ -26,12 +77,11 @@ def fetch_pubmed_articles(
         email (str): User email address (required by NCBI).
         api_key (str, optional): NCBI API key to increase rate limits.
 
-    Returns:
-        List[Dict]: A list of articles with their metadata.
+    Yields:
+        Dict: One article with its metadata per iteration.
     """
-    # Retrieve Entrez email and API key from environment variables
-    email = os.environ.get("ENTREZ_EMAIL")
-    api_key = os.environ.get("ENTREZ_API_KEY")  # optional to increase rate limits
+    email = _ENTREZ_EMAIL
+    api_key = _ENTREZ_API_KEY
 
     if not email:
         raise ValueError("ENTREZ_EMAIL environment variable is not set.")
@@ -44,10 +94,13 @@ def fetch_pubmed_articles(
     search_term = f'"{start_date}"[Date - Publication] : "{end_date}"[Date - Publication]'
 
     logger.info(f"Searching PubMed for articles from {start_date} to {end_date}")
-    handle = Entrez.esearch(db="pubmed", term=search_term, retmax=max_articles)
+    # usehistory keeps the result set on NCBI's history server so efetch can
+    # page through it by offset instead of round-tripping PMID lists
+    handle = Entrez.esearch(db="pubmed", term=search_term, retmax=max_articles, usehistory="y")
     record = Entrez.read(handle)
     handle.close()
-    id_list = record["IdList"]
+    webenv = record["WebEnv"]
+    query_key = record["QueryKey"]
     total_count = int(record["Count"])
     logger.info(f"Found {total_count} articles in the date range")
 
@@ -55,41 +108,57 @@ def fetch_pubmed_articles(
     max_articles = min(max_articles, total_count)
     logger.info(f"Fetching up to {max_articles} articles")
 
-    articles = []
+    fetched = 0
     batch_size = 100  # NCBI recommends fetching records in batches
-    for start in range(0, max_articles, batch_size):
-        end = min(max_articles, start + batch_size)
-        batch_ids = id_list[start:end]
-        logger.info(f"Fetching records {start + 1} to {end}")
-        fetch_handle = Entrez.efetch(db="pubmed", id=batch_ids, rettype="medline", retmode="text")
-        records = Medline.parse(fetch_handle)
-        for record in records:
-            article = parse_medline_record(record)
-            if article:
-                articles.append(article)
-        fetch_handle.close()
-        time.sleep(0.5)  # To respect NCBI rate limits!
+    windows = [(start, min(batch_size, max_articles - start))
+               for start in range(0, max_articles, batch_size)]
 
-    logger.info(f"Fetched {len(articles)} articles with abstracts")
-    return articles
+    # NCBI allows 10 requests/second with an API key, 3 without; the windows
+    # are independent, so fetch them concurrently up to that quota instead of
+    # sleeping between serial round-trips
+    rate = 10 if api_key else 3
+    rate_limiter = RateLimiter(rate)
+    with requests.Session() as session, \
+         ThreadPoolExecutor(max_workers=min(rate, len(windows) or 1)) as executor:
+        futures = [executor.submit(_efetch_batch, session, start, retmax, webenv, query_key,
+                                   email, api_key, rate_limiter)
+                   for start, retmax in windows]
+        for idx, future in enumerate(futures):
+            batch_articles = future.result()
+            logger.info(f"Fetched records {idx * batch_size + 1} to {idx * batch_size + len(batch_articles)}")
+            fetched += len(batch_articles)
+            yield from batch_articles
 
-def parse_medline_record(record) -> Optional[Dict]:
-    """Parses a Medline record into the desired format."""
-    pmid = record.get('PMID')
-    title = record.get('TI') or record.get('Title')
-    abstract = record.get('AB') or record.get('Abstract')
-    authors = record.get('AU') or []
-    journal = record.get('JT') or record.get('TA') or record.get('Journal')
-    year = None
-    if 'DP' in record:
-        year_match = record['DP'][:4]
-        if year_match.isdigit():
-            year = int(year_match)
+    logger.info(f"Fetched {fetched} articles with abstracts")
 
+def parse_pubmed_article(elem) -> Optional[Dict]:
+    """Parses a <PubmedArticle> XML element into the desired format."""
+    # A large share of PubMed records carry no abstract and get discarded
+    # anyway, so check that first and skip the rest of the field parsing.
+    # Structured abstracts carry one AbstractText per section; join them.
+    abstract = " ".join(
+        "".join(section.itertext()).strip()
+        for section in elem.findall('.//Abstract/AbstractText')
+    ).strip() or None
     if not abstract:
-        logger.warning(f"No abstract found for PMID {pmid}, skipping")
+        logger.warning(f"No abstract found for PMID {elem.findtext('.//PMID')}, skipping")
         return None
 
+    pmid = elem.findtext('.//PMID')
+    title = elem.findtext('.//ArticleTitle')
+    authors = []
+    for author in elem.findall('.//AuthorList/Author'):
+        last_name = author.findtext('LastName')
+        initials = author.findtext('Initials')
+        if last_name:
+            authors.append(f"{last_name} {initials}" if initials else last_name)
+    journal = elem.findtext('.//Journal/Title')
+    year = None
+    year_text = (elem.findtext('.//JournalIssue/PubDate/Year')
+                 or elem.findtext('.//JournalIssue/PubDate/MedlineDate', ''))[:4]
+    if year_text.isdigit():
+        year = int(year_text)
+
     article = {
         "pmid": pmid,
         "title": title,
@@ -106,13 +175,39 @@ def fetch_and_save_articles(
         max_articles: int,
         output_file: str
     ) -> None:
-    """Fetches articles and saves them to a JSON file."""
-    articles = fetch_pubmed_articles(start_date, end_date, max_articles=max_articles)
-    if articles:
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        # Save articles to data.json
-        with open(output_file, 'w') as f:
-            json.dump(articles, f, indent=4)
-        logger.info(f"Saved {len(articles)} articles to {output_file}")
+    """Fetches articles and streams them to an NDJSON file, one per line.
+
+    Writing each article as its batch returns bounds memory to one batch
+    instead of the whole corpus, and skips pretty-printing the output,
+    which is only ever read back by machines.
+    """
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    count = 0
+    with open(output_file, 'wb') as f:
+        for article in fetch_pubmed_articles(start_date, end_date, max_articles=max_articles):
+            f.write(orjson.dumps(article) + b"\n")
+            count += 1
+    if count:
+        logger.info(f"Saved {count} articles to {output_file}")
     else:
-        logger.info("No articles were fetched.")
\ No newline at end of file
+        logger.info("No articles were fetched.")
+
+def load_articles(path: str) -> List[Dict]:
+    """Loads articles from NDJSON (one JSON object per line) or a JSON array.
+
+    fetch_and_save_articles writes NDJSON; data files from before the format
+    change are a single indented JSON array, so sniff the first byte and
+    fall back to a whole-file parse for those.
+    """
+    with open(path, 'rb') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == b'[':
+            return orjson.loads(f.read())
+        articles = []
+        for line in f:
+            if line.strip():
+                articles.append(orjson.loads(line))
+        return articles
\ No newline at end of file
@@ -1,29 +1,107 @@
+import atexit
+import os
+import time
 import requests
 import logging
-from typing import List
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from src.ratelimit import RateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Cached misses are retried after a week; hits never expire
+NEGATIVE_CACHE_TTL = 7 * 24 * 3600
+
 class PubTatorAPI:
-    def __init__(self, base_url="https://www.ncbi.nlm.nih.gov/research/pubtator3-api/"):
+    # One limiter for all instances and threads: NCBI's policy is about
+    # 3 requests/second, and the extraction workers fan out far wider
+    _rate_limiter = RateLimiter(3)
+
+    def __init__(self, base_url="https://www.ncbi.nlm.nih.gov/research/pubtator3-api/", max_concurrent_requests: int = 8,
+                 cache_path="./data/pubtator_cache.json"):
         """Initialize the PubTatorAPI with the specified base URL with the Pubtator API endpoints."""
         self.base_url = base_url
+        self.max_concurrent_requests = max_concurrent_requests
+
+        # One pooled session for the whole run: reusing connections skips the
+        # TCP+TLS handshake that otherwise dominates these short API calls
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=3)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Persistent lookup cache so each unique entity name costs one
+        # network round-trip for the entire corpus
+        self.cache_path = cache_path
+        self._entity_id_cache = self._load_cache()
+        atexit.register(self.save_cache)
+
+    def _load_cache(self) -> Dict:
+        """Load the persistent entity ID cache, or start empty if missing/corrupt."""
+        try:
+            if os.path.exists(self.cache_path) and os.path.getsize(self.cache_path) > 0:
+                with open(self.cache_path, 'rb') as f:
+                    return orjson.loads(f.read())
+        except Exception as e:
+            logger.warning(f"Could not load PubTator cache from {self.cache_path}: {e}")
+        return {}
+
+    def save_cache(self) -> None:
+        """Persist the entity ID cache to disk."""
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, 'wb') as f:
+                f.write(orjson.dumps(self._entity_id_cache))
+        except Exception as e:
+            logger.error(f"Error saving PubTator cache: {e}")
+
+    def find_entity_ids_batch(self, entity_names: List[str], limit: int = 5) -> Dict[str, List[str]]:
+        """Find entity IDs for several entity names with concurrent requests.
+
+        The lookups are independent, so issuing them together replaces the sum
+        of their latencies with roughly the max. Names whose lookup failed are
+        omitted from the result.
+        """
+        results = {}
+        if not entity_names:
+            return results
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent_requests, len(entity_names))) as executor:
+            futures = {name: executor.submit(self.find_entity_id, name, limit) for name in entity_names}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger.warning(f"PubTator lookup failed for '{name}': {e}")
+        return results
 
     def find_entity_id(self, entity_name: str, limit: int = 5) -> List[str]:
         """Find entity IDs in PubTator for a given entity name."""
+        cache_key = entity_name.strip().lower()
+        cached = self._entity_id_cache.get(cache_key)
+        if cached is not None:
+            # Empty results are retried once their TTL has passed
+            if cached["ids"] or time.time() - cached["timestamp"] < NEGATIVE_CACHE_TTL:
+                return cached["ids"]
+
         url = f"{self.base_url}entity/autocomplete/"
         params = {"query": entity_name, "limit": limit}
-        response = requests.get(url, params=params)
+        self._rate_limiter.acquire()
+        response = self.session.get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         # list of entity IDs matching the entity name.
-        return [item["id"] for item in data if "id" in item]
+        entity_ids = [item["id"] for item in data if "id" in item]
+        self._entity_id_cache[cache_key] = {"ids": entity_ids, "timestamp": time.time()}
+        return entity_ids
 
     def find_related_entities(self, entity_id: str, relation_type: str, entity_type: str, limit: int = 5):
         """Find related entities in PubTator for a given entity ID and relation type, optionally."""
         url = f"{self.base_url}relations"
         params = {"e1": entity_id, "type": relation_type, "e2": entity_type, "limit": limit}
-        response = requests.get(url, params=params)
+        self._rate_limiter.acquire()
+        response = self.session.get(url, params=params, timeout=10)
         response.raise_for_status()
         # list of dictionaries representing related entities and their relations
         return response.json().get("relations", [])
@@ -32,7 +110,12 @@ class PubTatorAPI:
         """Search PubTator for a given query."""
         url = f"{self.base_url}search/"
         params = {"text": query, "page": page}
-        response = requests.get(url, params=params)
+        self._rate_limiter.acquire()
+        response = self.session.get(url, params=params, timeout=10)
         response.raise_for_status()
         # dictionary with JSON response from the PubTator search API containing search results
-        return response.json()
\ No newline at end of file
+        return response.json()
+
+    def close(self) -> None:
+        """Release pooled connections."""
+        self.session.close()
@@ -0,0 +1,22 @@
+import time
+import threading
+
+class RateLimiter:
+    """Token bucket shared across threads: at most `rate` acquisitions per second.
+
+    Each acquire reserves the next free time slot under the lock and sleeps
+    until it arrives, so requests are evenly spaced rather than bursty.
+    """
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)